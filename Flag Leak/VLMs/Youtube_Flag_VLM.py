@@ -1,91 +1,280 @@
-import os
-import re
-import cv2
+import heapq
+import itertools
+import queue
+import threading
+import av
+import hyperscan
+import numpy as np
+import torch
 import yt_dlp
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from PIL import Image
-from llava.eval.run_llava import load_model_and_tokenizer, chat
-from transformers import CLIPImageProcessor
+from transformers import AutoModelForVision2Seq, AutoProcessor, BitsAndBytesConfig
+
+_flag_db = hyperscan.Database()
+_flag_db.compile(
+    expressions=[rb"FLAG_[A-Za-z0-9_]+"],
+    ids=[0],
+    flags=[hyperscan.HS_FLAG_SOM_LEFTMOST],
+)
+
+def find_flag(text):
+    # Hyperscan reports every end offset of a match: keep the leftmost start and its furthest end
+    data = text.encode("utf-8")
+    matches = []
+
+    def on_match(match_id, start, end, flags, context):
+        matches.append((start, end))
+
+    _flag_db.scan(data, match_event_handler=on_match)
+    if not matches:
+        return None
+    start = min(match_start for match_start, _ in matches)
+    end = max(match_end for match_start, match_end in matches if match_start == start)
+    return data[start:end].decode("utf-8")
+
+def load_model_and_processor(model_name):
+    # 4-bit NF4 weights for the language model; the CLIP vision tower and projector stay in FP16
+    quantization_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_quant_type="nf4",
+        llm_int8_skip_modules=["vision_tower", "multi_modal_projector", "lm_head"],
+    )
+    model = AutoModelForVision2Seq.from_pretrained(
+        model_name,
+        quantization_config=quantization_config,
+        torch_dtype=torch.float16,
+        device_map="auto",
+    ).eval()
+    # LlavaProcessor: the CLIP image processor and the tokenizer of the same checkpoint
+    processor = AutoProcessor.from_pretrained(model_name)
+    processor.tokenizer.padding_side = "left" # Batched generate() continues right after each prompt
+    return model, processor
 
 def read_video_urls(txt_path):
     with open(txt_path, 'r', encoding='utf-8') as f:
         return [line.strip() for line in f if line.strip()]
 
+# YoutubeDL is not thread-safe, so every metadata thread reuses its own instance
+_metadata_local = threading.local()
+
+def _metadata_ydl():
+    ydl = getattr(_metadata_local, "ydl", None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True})
+        _metadata_local.ydl = ydl
+    return ydl
+
 def get_video_metadata(url):
     try:
-        with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
-            info = ydl.extract_info(url, download=False)
-            upload_date = info.get("upload_date")
-            if upload_date:
-                upload_datetime = datetime.strptime(upload_date, "%Y%m%d")
-                return {
-                    "url": url,
-                    "upload_date": upload_datetime,
-                    "id": info.get("id"),
-                    "title": info.get("title")
-                }
+        info = _metadata_ydl().extract_info(url, download=False)
+        upload_date = info.get("upload_date")
+        if upload_date:
+            upload_datetime = datetime.strptime(upload_date, "%Y%m%d")
+            return {
+                "url": url,
+                "upload_date": upload_datetime,
+                "id": info.get("id"),
+                "title": info.get("title")
+            }
     except Exception as e:
         print(f"Metadata error: {e}")
     return None
 
-def extract_frames_every_n_seconds(video_path, interval=1):
-    frames = []
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print(f"⚠️ Cannot open video file: {video_path}")
-        return frames
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps if fps > 0 else 0
-    for sec in range(0, int(duration), interval):
-        frame_num = int(fps * sec)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-        success, frame = cap.read()
-        if success:
-            frame_path = f"temp_frame_{sec}.jpg"
-            cv2.imwrite(frame_path, frame)
-            frames.append((sec, frame_path))
-    cap.release()
-    return frames
-
-def vlm_flag_check(image_path, model, tokenizer, processor, prompt):
-    image = Image.open(image_path).convert("RGB")
-    response = chat(
-        model=model,
-        tokenizer=tokenizer,
-        processor=processor,
-        image=image,
-        query=prompt
-    )
-    if "FLAG_" in response:
-        match = re.search(r"FLAG_[A-Za-z0-9_]+", response)
-        if match:
-            return match.group()
+def videos_newest_first(urls, min_results=8, max_workers=8):
+    # Yields videos newest first while metadata for the remaining URLs is still being fetched
+    min_results = min(min_results, len(urls))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {executor.submit(get_video_metadata, url) for url in urls}
+    heap = []
+    tie_breaker = itertools.count()
+    arrived = 0
+    try:
+        while pending or heap:
+            block = pending and (arrived < min_results or not heap)
+            done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                arrived += 1
+                meta = future.result()
+                if meta:
+                    heapq.heappush(heap, (-meta["upload_date"].timestamp(), next(tie_breaker), meta))
+            if heap and (arrived >= min_results or not pending):
+                yield heapq.heappop(heap)[-1]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_video_duration(container, stream):
+    if stream.duration is not None:
+        return float(stream.duration * stream.time_base)
+    if container.duration is not None:
+        return container.duration / av.time_base
     return None
 
-def scan_video(video, model, tokenizer, processor, prompt):
-    print(f"\n📥 Downloading: {video['url']}")
+def sample_frames(container, stream, duration, interval):
+    if interval > 1 and duration:
+        # Sparse sampling: seek to the keyframe before each sample point and decode forward from there
+        for sec in range(0, int(duration), interval):
+            container.seek(int(sec / stream.time_base), stream=stream)
+            for frame in container.decode(stream):
+                if frame.time is not None and frame.time >= sec:
+                    yield sec, frame
+                    break
+        return
+    next_sec = 0
+    for frame in container.decode(stream):
+        if frame.time is None or frame.time < next_sec:
+            continue
+        sec = int(frame.time // interval) * interval
+        yield sec, frame
+        next_sec = sec + interval
+
+def stack_frames(samples, num_samples):
+    # Only sampled frames are converted to BGR, into one preallocated (N, H, W, 3) array
+    secs = []
+    stack = None
+    try:
+        for sec, frame in samples:
+            if stack is None:
+                image = frame.to_ndarray(format="bgr24")
+                stack = np.empty((max(num_samples, 1), *image.shape), dtype=np.uint8)
+            else:
+                image = frame.to_ndarray(width=stack.shape[2], height=stack.shape[1], format="bgr24")
+                if len(secs) == len(stack):
+                    stack = np.concatenate([stack, np.empty_like(stack)])
+            stack[len(secs)] = image
+            secs.append(sec)
+    except av.error.FFmpegError as e:
+        # A broken stream (e.g. a network error after FFmpeg's reconnects) should not discard decoded frames
+        print(f"⚠️ Decoding stopped after {len(secs)} frames: {e}")
+    if stack is None:
+        return []
+    return list(zip(secs, stack[:len(secs)]))
+
+def extract_frames_every_n_seconds(video_source, interval=1, options=None):
+    # 'video_source' can be a local file or a direct stream URL decoded while it downloads
+    try:
+        container = av.open(video_source, options=options)
+    except Exception as e:
+        print(f"⚠️ Cannot open video: {video_source} ({e})")
+        return []
+    with container:
+        if not container.streams.video:
+            print(f"⚠️ No video stream in: {video_source}")
+            return []
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        duration = get_video_duration(container, stream)
+        num_samples = int(duration // interval) + 1 if duration else 64
+        return stack_frames(sample_frames(container, stream, duration, interval), num_samples)
+
+def vlm_flag_check(batch, model, processor, prompt):
+    # One generate() call for the whole batch so the vision tower and prefill are amortized
+    images = [Image.fromarray(frame[:, :, ::-1]) for _, frame in batch]
+    query = f"USER: <image>\n{prompt} ASSISTANT:"
+    # The processor expands <image> into one token per image feature, which the model requires
+    inputs = processor(
+        text=[query] * len(images),
+        images=images,
+        return_tensors="pt",
+        padding=True
+    ).to(model.device)
+    inputs["pixel_values"] = inputs["pixel_values"].to(model.dtype)
+    with torch.inference_mode():
+        output_ids = model.generate(**inputs, max_new_tokens=64)
+    responses = processor.batch_decode(
+        output_ids[:, inputs["input_ids"].shape[1]:],
+        skip_special_tokens=True
+    )
+    for (sec, _), response in zip(batch, responses):
+        flag = find_flag(response)
+        if flag:
+            return sec, flag
+    return None, None
+
+def get_stream_source(video):
+    # Resolves the direct media URL so PyAV can decode it without writing the video to disk
+    print(f"\n🔗 Resolving stream: {video['url']}")
     ydl_opts = {
         'quiet': True,
-        'format': 'mp4[height<=360]',
-        'outtmpl': f"{video['id']}.%(ext)s",
+        'format': 'bestvideo[height<=360][ext=mp4]/mp4[height<=360]',
     }
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([video["url"]])
+            info = ydl.extract_info(video["url"], download=False)
+        fmt = next(
+            (f for f in info.get("requested_formats") or [info] if f.get("vcodec") != "none" and f.get("url")),
+            None
+        )
+        if fmt:
+            headers = dict(fmt.get("http_headers") or info.get("http_headers") or {})
+            # Reconnect on dropped connections, and give up on a stalled one after 30 s (in microseconds)
+            options = {'reconnect': '1', 'reconnect_streamed': '1', 'reconnect_delay_max': '5', 'rw_timeout': '30000000'}
+            user_agent = headers.pop("User-Agent", None)
+            if user_agent:
+                options['user_agent'] = user_agent
+            if headers:
+                options['headers'] = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+            return fmt["url"], options
+        print(f"No video stream URL for: {video['url']}")
+    except Exception as e:
+        print(f"Stream resolve error: {e}")
+    return None
+
+def fetch_frames(video):
+    source = get_stream_source(video)
+    if not source:
+        return []
+    stream_url, options = source
+    try:
+        return extract_frames_every_n_seconds(stream_url, interval=1, options=options)
+    except Exception as e:
+        print(f"Frame extraction error: {e}")
+    return []
+
+_VIDEOS_DONE = object()
 
-        video_path = f"{video['id']}.mp4"
-        frames = extract_frames_every_n_seconds(video_path, interval=1)
+def fetch_in_background(videos, maxsize=1):
+    # Downloads and decodes the next video's frames in a background thread while the caller scans the current one;
+    # maxsize bounds how many decoded videos wait in memory
+    ready = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
 
-        for sec, frame_path in frames:
-            print(f"\n🖼️ Checking frame at {sec}s...")
-            flag = vlm_flag_check(frame_path, model, tokenizer, processor, prompt)
-            os.remove(frame_path)
+    def producer():
+        try:
+            for video in videos:
+                if stop.is_set():
+                    break
+                ready.put((video, fetch_frames(video)))
+        finally:
+            ready.put(_VIDEOS_DONE)
+
+    threading.Thread(target=producer, daemon=True).start()
+    finished = False
+    try:
+        while True:
+            item = ready.get()
+            if item is _VIDEOS_DONE:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished:
+            # The caller stopped early: let the producer exit
+            stop.set()
+            while ready.get() is not _VIDEOS_DONE:
+                pass
+
+def scan_video(video, frames, model, processor, prompt, batch_size=8):
+    try:
+        for start in range(0, len(frames), batch_size):
+            batch = frames[start:start + batch_size]
+            print(f"\n🖼️ Checking frames at {batch[0][0]}s-{batch[-1][0]}s...")
+            sec, flag = vlm_flag_check(batch, model, processor, prompt)
             if flag:
                 print(f"\n✅ FLAG FOUND: {flag} at {sec}s in {video['url']}")
                 return flag
-
-        os.remove(video_path)
     except Exception as e:
         print(f"Video scan error: {e}")
     return None
@@ -99,19 +288,26 @@ def main():
 
     print("🚀 Loading LLaVA model...")
     model_name = "llava-hf/llava-1.5-7b-hf"
-    model, tokenizer, processor = load_model_and_tokenizer(model_path=model_name)
+    model, processor = load_model_and_processor(model_name)
+    torch.backends.cuda.matmul.allow_tf32 = True
 
     urls = read_video_urls("deneme.txt")
-    videos = [get_video_metadata(url) for url in urls if get_video_metadata(url)]
-    videos.sort(key=lambda x: x["upload_date"], reverse=True)
+    videos = videos_newest_first(urls)
+    sources = fetch_in_background(videos)
 
-    for i, video in enumerate(videos, 1):
-        print(f"\n[{i}/{len(videos)}] Scanning: {video['title']} ({video['upload_date'].strftime('%Y-%m-%d')})")
-        flag = scan_video(video, model, tokenizer, processor, prompt)
-        if flag:
-            break
-    else:
-        print("\n🚫 No FLAG_ found in any video.")
+    try:
+        for i, (video, frames) in enumerate(sources, 1):
+            if not frames:
+                continue
+            print(f"\n[{i}/{len(urls)}] Scanning: {video['title']} ({video['upload_date'].strftime('%Y-%m-%d')})")
+            flag = scan_video(video, frames, model, processor, prompt)
+            if flag:
+                break
+        else:
+            print("\n🚫 No FLAG_ found in any video.")
+    finally:
+        sources.close()
+        videos.close()
 
 if __name__ == "__main__":
     main()
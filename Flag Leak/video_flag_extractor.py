@@ -1,10 +1,80 @@
 import os
 import re
+import heapq
+import itertools
+import multiprocessing
+import queue
+import threading
+from functools import partial
+import av
 import cv2
-import pytesseract
+import hyperscan
+import numpy as np
+import tesserocr
 import yt_dlp
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
+# Flag patterns, compiled once into a single Hyperscan database
+FLAG_PATTERN_ID = 0     # Descriptions and subtitles
+OCR_FLAG_PATTERN_ID = 1 # Normalized OCR text (upper case only, at least 4 characters after FLAG_)
+_flag_db = hyperscan.Database()
+_flag_db.compile(
+    expressions=[rb"FLAG_[A-Za-z0-9_]+", rb"FLAG_[A-Z0-9_]{4,}"],
+    ids=[FLAG_PATTERN_ID, OCR_FLAG_PATTERN_ID],
+    flags=[hyperscan.HS_FLAG_SOM_LEFTMOST, hyperscan.HS_FLAG_SOM_LEFTMOST],
+)
+
+def _leftmost_match(data, pattern_id):
+    """
+    Scans the bytes with the precompiled Hyperscan database.
+    Hyperscan reports every (start, end) offset of a match, so the leftmost start with
+    the furthest end is picked, which is the same span re.search would return.
+    Returns the (start, end) offsets of the match, or None if there is no match.
+    """
+    matches = []
+
+    def on_match(match_id, start, end, flags, context):
+        if match_id == pattern_id:
+            matches.append((start, end))
+
+    _flag_db.scan(data, match_event_handler=on_match)
+    if not matches:
+        return None
+    start = min(match_start for match_start, _ in matches)
+    end = max(match_end for match_start, match_end in matches if match_start == start)
+    return start, end
+
+def find_flag(text, pattern_id=FLAG_PATTERN_ID):
+    """
+    Returns the first flag found in the text, or None if the text contains no flag.
+    """
+    data = text.encode("utf-8")
+    span = _leftmost_match(data, pattern_id)
+    if span is None:
+        return None
+    return data[span[0]:span[1]].decode("utf-8")
+
+SOURCE_SEPARATOR = b"\x01" # Can never be part of a flag, so matches cannot span two sources
+
+def find_flag_in_sources(parts, pattern_id=FLAG_PATTERN_ID):
+    """
+    Scans several texts for a flag in a single Hyperscan pass.
+    'parts' is a list of (source_name, text) tuples; the texts are joined into one buffer with
+    SOURCE_SEPARATOR between them, and the source of a match is found by counting the separators
+    before it. Earlier parts win, as with separate scans in the same order.
+    Returns the found flag and its source name, otherwise (None, None).
+    """
+    corpus = SOURCE_SEPARATOR.join(
+        text.encode("utf-8").replace(SOURCE_SEPARATOR, b" ") for _, text in parts
+    )
+    span = _leftmost_match(corpus, pattern_id)
+    if span is None:
+        return None, None
+    start, end = span
+    source = parts[corpus.count(SOURCE_SEPARATOR, 0, start)][0]
+    return corpus[start:end].decode("utf-8"), source
+
 def read_video_urls(txt_path):
     """
     Reads video URLs from a given text file.
@@ -13,6 +83,20 @@ def read_video_urls(txt_path):
     with open(txt_path, 'r', encoding='utf-8') as f:
         return [line.strip() for line in f if line.strip()]
 
+# One metadata-only YoutubeDL instance per thread, reused for every URL that thread handles
+_metadata_local = threading.local()
+
+def _metadata_ydl():
+    """
+    Returns the current thread's metadata-only yt_dlp.YoutubeDL instance, creating it on first use.
+    Reusing it avoids rebuilding the extractors and HTTP session (and new connections) for every URL.
+    """
+    ydl = getattr(_metadata_local, "ydl", None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True})
+        _metadata_local.ydl = ydl
+    return ydl
+
 def get_video_metadata(url):
     """
     Retrieves metadata for a given YouTube video URL using yt-dlp.
@@ -20,105 +104,329 @@ def get_video_metadata(url):
     otherwise returns None.
     """
     try:
-        with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
-            info = ydl.extract_info(url, download=False)
-            upload_date = info.get("upload_date")
-            if upload_date:
-                upload_datetime = datetime.strptime(upload_date, "%Y%m%d")
-                return {
-                    "url": url,
-                    "upload_date": upload_datetime,
-                    "id": info.get("id"),
-                    "title": info.get("title")
-                }
+        info = _metadata_ydl().extract_info(url, download=False)
+        upload_date = info.get("upload_date")
+        if upload_date:
+            upload_datetime = datetime.strptime(upload_date, "%Y%m%d")
+            return {
+                "url": url,
+                "upload_date": upload_datetime,
+                "id": info.get("id"),
+                "title": info.get("title")
+            }
     except Exception as e:
         print(f"⚠️ Metadata error: {e}")
     return None
 
-def extract_frames_every_n_seconds(video_path, interval=1):
+def videos_newest_first(urls, min_results=8, max_workers=8):
+    """
+    Fetches video metadata concurrently and yields the videos from newest to oldest
+    without waiting for every request to finish.
+    Results are kept in a heap keyed by upload date; once 'min_results' of them have arrived,
+    the newest known video is yielded while metadata for the remaining URLs keeps arriving.
+    Closing the generator cancels the metadata requests that have not started yet.
+    """
+    min_results = min(min_results, len(urls))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {executor.submit(get_video_metadata, url) for url in urls}
+    heap = []
+    tie_breaker = itertools.count() # Keeps heap entries comparable when dates are equal
+    arrived = 0
+    try:
+        while pending or heap:
+            # Only block while too few results are known; otherwise just collect what has finished
+            block = pending and (arrived < min_results or not heap)
+            done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                arrived += 1
+                meta = future.result()
+                if meta:
+                    heapq.heappush(heap, (-meta["upload_date"].timestamp(), next(tie_breaker), meta))
+            if heap and (arrived >= min_results or not pending):
+                yield heapq.heappop(heap)[-1]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_video_duration(container, stream):
+    """
+    Returns the duration of a video stream in seconds, or None if the container does not report it.
+    """
+    if stream.duration is not None:
+        return float(stream.duration * stream.time_base)
+    if container.duration is not None:
+        return container.duration / av.time_base
+    return None
+
+def sample_frames(container, stream, duration, interval):
+    """
+    Yields (second, av.VideoFrame) tuples for one frame every 'interval' seconds.
+    For interval=1 the video is decoded once, using the presentation timestamp of each frame
+    (no FPS or frame count needed). For longer intervals it seeks to the keyframe before each
+    sample point and decodes forward from there, instead of decoding every frame in between.
     """
-    Extracts frames from a video at a specified interval (in seconds).
+    if interval > 1 and duration:
+        for sec in range(0, int(duration), interval):
+            # Seeks to the closest keyframe at or before 'sec'
+            container.seek(int(sec / stream.time_base), stream=stream)
+            for frame in container.decode(stream):
+                if frame.time is not None and frame.time >= sec:
+                    yield sec, frame
+                    break
+        return
+
+    next_sec = 0
+    for frame in container.decode(stream):
+        # Skip frames without a timestamp and frames before the next sample point
+        if frame.time is None or frame.time < next_sec:
+            continue
+        sec = int(frame.time // interval) * interval
+        yield sec, frame
+        next_sec = sec + interval
+
+def stack_frames(samples, num_samples):
+    """
+    Converts sampled frames to BGR and stores them in one preallocated (N, H, W, 3) uint8 array,
+    so all frames share a single contiguous allocation instead of one array per frame.
+    The first frame fixes H and W; frames of a different size are scaled to it while converting.
+    If more than 'num_samples' frames arrive, the array is grown.
+    If decoding fails part-way, the frames decoded so far are kept.
+    Returns a list of (second, frame_image) tuples whose images are views into that array.
+    """
+    secs = []
+    stack = None
+    try:
+        for sec, frame in samples:
+            if stack is None:
+                image = frame.to_ndarray(format="bgr24")
+                stack = np.empty((max(num_samples, 1), *image.shape), dtype=np.uint8)
+            else:
+                image = frame.to_ndarray(width=stack.shape[2], height=stack.shape[1], format="bgr24")
+                if len(secs) == len(stack):
+                    stack = np.concatenate([stack, np.empty_like(stack)])
+            stack[len(secs)] = image
+            secs.append(sec)
+    except av.error.FFmpegError as e:
+        # A broken stream (e.g. a network error after FFmpeg's reconnects) should not discard decoded frames
+        print(f"⚠️ Warning: Decoding stopped after {len(secs)} frames: {e}")
+    if stack is None:
+        return []
+    return list(zip(secs, stack[:len(secs)]))
+
+def extract_frames_every_n_seconds(video_source, interval=1, options=None):
+    """
+    Extracts frames from a video at a specified interval (in seconds) with PyAV.
+    'video_source' can be a local file or a direct stream URL; 'options' are passed to FFmpeg
+    (e.g. HTTP headers), so a stream is decoded while it downloads without touching the disk.
     Returns a list of tuples, where each tuple contains (second, frame_image).
-    Handles cases where FPS or total frames cannot be read.
-    """
-    frames = []
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    # If FPS is 0 or unreadable, use a default value (e.g., 30)
-    if fps == 0:
-        print(f"⚠️ Warning: Video FPS value could not be read or is 0. Defaulting to FPS=30: {video_path}")
-        fps = 30 # Or an appropriate default value
-
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    # If total_frames or fps is 0, duration calculation might be problematic.
-    if total_frames == 0 or fps == 0:
-        print(f"⚠️ Warning: Video duration cannot be calculated as total frames or FPS is zero: {video_path}")
-        cap.release()
-        return frames # Return an empty list of frames
-
-    duration = total_frames / fps
-    for sec in range(0, int(duration), interval):
-        frame_num = int(fps * sec)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-        success, frame = cap.read()
-        if success:
-            frames.append((sec, frame))
-    cap.release()
-    return frames
-
-def detect_flag_with_tesseract(frames, video_id):
+    Only the sampled frames are converted to BGR images (see sample_frames and stack_frames).
     """
-    Detects a 'FLAG_' pattern in video frames using Tesseract OCR.
-    Saves extracted frames and OCR output to a directory named 'frames_{video_id}'.
-    Applies image preprocessing (resizing, grayscale, adaptive thresholding) for better OCR.
-    Returns the found flag and its source (visual at {second} sec) if detected, otherwise None.
+    try:
+        container = av.open(video_source, options=options)
+    except Exception as e:
+        print(f"⚠️ Warning: Video could not be opened: {video_source} ({e})")
+        return [] # Return an empty list of frames
+
+    with container:
+        if not container.streams.video:
+            print(f"⚠️ Warning: No video stream found: {video_source}")
+            return []
+
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO" # Let FFmpeg decode with multiple threads
+        duration = get_video_duration(container, stream)
+        # Number of sample points if the duration is known, otherwise a first guess that is grown as needed
+        num_samples = int(duration // interval) + 1 if duration else 64
+        return stack_frames(sample_frames(container, stream, duration, interval), num_samples)
+
+# Per-worker-process OCR state, created once by _init_ocr_worker
+_tess_api = None
+_cuda_stream = None
+_ocr_cancelled = None
+_ocr_init_error = None
+
+def _init_ocr_worker(cancel_event):
+    """
+    Initializes one persistent Tesseract engine per worker process.
+    'cancel_event' is shared with the parent, which sets it to drop the queued frames of a video.
+    The language data is loaded once and the engine is reused for every frame,
+    instead of starting a new tesseract process per frame.
+    If OpenCV was built with CUDA and a GPU is available, also prepares a CUDA stream
+    so that preprocessing runs on the GPU.
+    If the engine cannot be created (e.g. TESSDATA_PREFIX is wrong), the error is kept and reported
+    for every frame instead of raising, which would make the pool respawn the worker forever.
     """
-    output_dir = f"frames_{video_id}"
-    os.makedirs(output_dir, exist_ok=True)
+    global _tess_api, _cuda_stream, _ocr_cancelled, _ocr_init_error
+    _ocr_cancelled = cancel_event
+    try:
+        _tess_api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK) # Same as "--psm 6"
+    except Exception as e:
+        _ocr_init_error = f"Tesseract could not be initialized: {e}"
+        return
+    cv2.setNumThreads(1) # The pool already runs one worker per core, avoid OpenCV thread oversubscription
 
-    for sec, frame in frames:
-        try:
+    # CUDA is only touched inside the workers, so the parent process can still fork them safely
+    try:
+        if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            _cuda_stream = cv2.cuda_Stream()
+    except (AttributeError, cv2.error):
+        _cuda_stream = None # OpenCV without CUDA support, stay on the CPU
+
+def _otsu_threshold(hist):
+    """
+    Picks the global threshold that maximizes Otsu's between-class variance
+    for a 256-bin grayscale histogram. Pixels brighter than the returned value are foreground.
+    """
+    hist = np.asarray(hist, dtype=np.float64).ravel()
+    weight_bg = np.cumsum(hist) # Number of pixels <= t
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_sum = np.cumsum(hist * np.arange(256))
+    mean_bg = cum_sum / np.maximum(weight_bg, 1)
+    mean_fg = (cum_sum[-1] - cum_sum) / np.maximum(weight_fg, 1)
+    between_var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between_var))
+
+def _preprocess_on_gpu(frame):
+    """
+    GPU version of the grayscale + Otsu threshold preprocessing.
+    The frame is uploaded once; only the histogram and the final binary image are downloaded.
+    """
+    gpu_frame = cv2.cuda_GpuMat()
+    gpu_frame.upload(frame, _cuda_stream)
+    gray = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2GRAY, stream=_cuda_stream)
+    hist = cv2.cuda.calcHist(gray, stream=_cuda_stream).download(_cuda_stream)
+    _cuda_stream.waitForCompletion()
+
+    _, thresh = cv2.cuda.threshold(gray, _otsu_threshold(hist), 255, cv2.THRESH_BINARY, stream=_cuda_stream)
+    result = thresh.download(_cuda_stream)
+    _cuda_stream.waitForCompletion()
+    return result
+
+def _ocr_worker(item, output_dir=None):
+    """
+    Preprocesses a single (second, frame) item and runs Tesseract OCR on it.
+    Runs inside a worker process of detect_flag_with_tesseract's pool.
+    If 'output_dir' is given, the frame and its OCR output are saved there for debugging.
+    Returns a tuple of (second, normalized_text, error_message);
+    normalized_text is None if the frame was skipped because the scan was cancelled.
+    """
+    sec, frame = item
+    if _ocr_cancelled.is_set():
+        return sec, None, None
+    if _ocr_init_error:
+        return sec, None, _ocr_init_error
+    try:
+        if output_dir:
             # Save the frame as .jpg
-            frame_path = f"{output_dir}/frame_{sec}.jpg"
-            cv2.imwrite(frame_path, frame)
-
-            # Magnification for OCR (for better OCR results)
-            scale_percent = 300 # You can adjust this value as needed
-            width = int(frame.shape[1] * scale_percent / 100)
-            height = int(frame.shape[0] * scale_percent / 100)
-            resized = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
-
-            # Preprocessing for OCR
-            gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.adaptiveThreshold(
-                gray, 255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY,
-                11, 2 # This block size and C value can also affect OCR results
-            )
-
-            # OCR configuration
-            config = "--psm 6" # Page segmentation mode, can be changed based on text layout
-            text = pytesseract.image_to_string(thresh, config=config)
+            cv2.imwrite(f"{output_dir}/frame_{sec}.jpg", frame)
+
+        # Preprocessing for OCR: grayscale + global Otsu threshold at native resolution.
+        # Overlay text has a uniform background, so one threshold per frame is enough,
+        # and skipping the 3x upscale gives Tesseract 9x fewer pixels to process.
+        if _cuda_stream is not None:
+            thresh = _preprocess_on_gpu(frame)
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            hist = np.bincount(gray.ravel(), minlength=256)
+            thresh = (gray > _otsu_threshold(hist)).astype(np.uint8) * 255
 
+        # OCR with the worker's engine (page segmentation mode is set in _init_ocr_worker)
+        _tess_api.SetImageBytes(thresh.tobytes(), thresh.shape[1], thresh.shape[0], 1, thresh.shape[1])
+        _tess_api.SetSourceResolution(200) # DPI hint instead of upscaling the frame
+        text = _tess_api.GetUTF8Text()
+
+        if output_dir:
             # Save OCR output
             with open(f"{output_dir}/ocr_{sec}.txt", "w", encoding="utf-8") as f:
                 f.write(text)
 
-            # Normalization
-            normalized = re.sub(r"[^A-Z0-9_]", "", text.upper())
+        # Normalization
+        normalized = re.sub(r"[^A-Z0-9_]", "", text.upper())
+        return sec, normalized, None
+    except Exception as e:
+        return sec, None, str(e)
+
+def _thumbnail(frame):
+    """
+    Shrinks a frame to a 160x90 grayscale thumbnail used to compare consecutive frames.
+    This is fine enough that a small caption appearing on a static background still changes it.
+    """
+    small = cv2.resize(frame, (160, 90), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+def skip_similar_frames(frames, max_diff=8):
+    """
+    Yields only the frames that differ from the last yielded frame, so static scenes are OCR'd once.
+    Two frames are considered the same if no pixel of their thumbnails differs by more than 'max_diff'
+    grey levels, which tolerates compression noise but not newly drawn text.
+    """
+    prev_thumb = None
+    for sec, frame in frames:
+        thumb = _thumbnail(frame)
+        if prev_thumb is not None and np.abs(thumb - prev_thumb).max() <= max_diff:
+            continue
+        prev_thumb = thumb
+        yield sec, frame
 
-            print(f"\n🔎 Frame {sec}s")
-            print(f"📝 Normalized: {normalized}")
+def until_cancelled(frames, cancel_event):
+    """
+    Yields the frames until 'cancel_event' is set, so no more frames are sent to the OCR pool after a match.
+    """
+    for item in frames:
+        if cancel_event.is_set():
+            return
+        yield item
 
-            # FLAG_ match
-            match = re.search(r"FLAG_[A-Z0-9_]{4,}", normalized)
-            if match:
-                print(f"✅ Match found: {match.group()}")
-                return match.group(), f"visual at {sec} sec"
+def create_ocr_pool():
+    """
+    Creates the OCR worker pool used for every video (half of the CPU cores).
+    Must be called before any other thread is started: forking a multi-threaded process
+    can deadlock, and creating the pool once also keeps each worker's Tesseract engine for the whole run.
+    Returns a tuple of (pool, cancel_event).
+    """
+    cancel_event = multiprocessing.Event()
+    processes = max(1, (os.cpu_count() or 2) // 2)
+    pool = multiprocessing.Pool(processes=processes, initializer=_init_ocr_worker, initargs=(cancel_event,))
+    return pool, cancel_event
 
-        except Exception as e:
-            print(f"⚠️ OCR error at {sec}s: {e}")
+def detect_flag_with_tesseract(frames, video_id, ocr_pool, debug_dump=False):
+    """
+    Detects a 'FLAG_' pattern in video frames using Tesseract OCR.
+    Frames are preprocessed (grayscale, Otsu thresholding) and OCR'd in parallel
+    by the worker processes of 'ocr_pool' (see create_ocr_pool), each keeping its own tesserocr engine
+    and using the GPU for preprocessing when OpenCV has CUDA support.
+    At the first match no further frames are sent to the pool and the ones already sent are skipped;
+    the pool itself stays alive.
+    Frames that look the same as the previously OCR'd frame are skipped (see skip_similar_frames).
+    If debug_dump is True, OCR'd frames and their OCR output are saved to a directory named 'frames_{video_id}'.
+    Returns the found flag and its source (visual at {second} sec) if detected, otherwise None.
+    """
+    output_dir = None
+    if debug_dump:
+        output_dir = f"frames_{video_id}"
+        os.makedirs(output_dir, exist_ok=True)
+
+    pool, cancel_event = ocr_pool
+    cancel_event.clear()
+    worker = partial(_ocr_worker, output_dir=output_dir)
+    results = pool.imap_unordered(worker, until_cancelled(skip_similar_frames(frames), cancel_event))
+    for sec, normalized, error in results:
+        if error:
+            print(f"⚠️ OCR error at {sec}s: {error}")
+            continue
+
+        print(f"\n🔎 Frame {sec}s")
+        print(f"📝 Normalized: {normalized}")
+
+        # FLAG_ match
+        flag = find_flag(normalized, OCR_FLAG_PATTERN_ID)
+        if flag:
+            print(f"✅ Match found: {flag}")
+            # No need to OCR the remaining frames: they are no longer sent, workers skip the ones
+            # already sent, and waiting for those makes sure none of them runs once the next video clears the event
+            cancel_event.set()
+            for _ in results:
+                pass
+            return flag, f"visual at {sec} sec"
     return None, None
 
 def scan_description_and_subs(info, video_id):
@@ -126,10 +434,7 @@ def scan_description_and_subs(info, video_id):
     Scans the video description and downloaded subtitles for a 'FLAG_' pattern.
     Returns the found flag and its source ('description' or 'subtitles') if detected, otherwise None.
     """
-    description = info.get("description", "")
-    match = re.search(r"FLAG_[A-Za-z0-9_]+", description)
-    if match:
-        return match.group(), "description"
+    parts = [("description", info.get("description") or "")]
 
     # Possible subtitle file names based on yt-dlp's common naming conventions
     possible_sub_files = [
@@ -146,153 +451,200 @@ def scan_description_and_subs(info, video_id):
 
     if found_subtitle_file:
         with open(found_subtitle_file, "r", encoding="utf-8") as f:
-            content = f.read()
-            match = re.search(r"FLAG_[A-Za-z0-9_]+", content)
-            if match:
-                # You can optionally delete the subtitle file if no longer needed
-                # try:
-                #     os.remove(found_subtitle_file)
-                # except OSError as e:
-                #     print(f"⚠️ Subtitle file could not be deleted: {e}")
-                return match.group(), "subtitles"
-    return None, None
+            parts.append(("subtitles", f.read()))
+        # You can optionally delete the subtitle file if no longer needed
+        # try:
+        #     os.remove(found_subtitle_file)
+        # except OSError as e:
+        #     print(f"⚠️ Subtitle file could not be deleted: {e}")
+
+    # Description and subtitles are scanned together in one pass
+    return find_flag_in_sources(parts)
 
-def scan_video(video):
+def get_stream_source(info_dict):
+    """
+    Picks the video-only part of the selected yt-dlp format and builds the FFmpeg options
+    (reconnect and read timeout settings, User-Agent and the other HTTP headers yt-dlp would send)
+    needed to open its URL with PyAV.
+    Returns a tuple of (stream_url, options), or None if no video URL is available.
     """
-    Downloads a video, then scans its description, subtitles, and frames for a 'FLAG_' pattern.
-    Prioritizes description/subtitles scan before frame extraction.
-    Deletes the downloaded video file after processing.
+    formats = info_dict.get("requested_formats") or [info_dict]
+    fmt = next((f for f in formats if f.get("vcodec") != "none" and f.get("url")), None)
+    if not fmt:
+        return None
+
+    headers = dict(fmt.get("http_headers") or info_dict.get("http_headers") or {})
+    # Let FFmpeg reconnect on dropped connections instead of failing mid-stream,
+    # and give up on a stalled connection after 30 s (in microseconds) instead of blocking forever
+    options = {'reconnect': '1', 'reconnect_streamed': '1', 'reconnect_delay_max': '5', 'rw_timeout': '30000000'}
+    user_agent = headers.pop("User-Agent", None)
+    if user_agent:
+        options['user_agent'] = user_agent
+    if headers:
+        options['headers'] = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+    return fmt["url"], options
+
+def fetch_video_info(video):
     """
-    print(f"\n📥 Downloading: {video['url']}")
+    Retrieves a video's full info and downloads only its English subtitles.
+    The video itself is not downloaded; its frames are later decoded straight from the stream URL.
+    Returns a tuple of (info_dict, stream_source); both are None if the request failed.
+    """
+    print(f"\n🔗 Resolving stream: {video['url']}")
     ydl_opts = {
         'quiet': True,
-        # REVISED FORMAT OPTION:
-        # Selects the best available MP4 video format with at least 720p height,
-        # if not available, selects the best available MP4 format.
-        # Higher resolution is targeted to improve OCR quality.
-        'format': 'bestvideo[height>=720][ext=mp4]+bestaudio[ext=m4a]/best[height>=720][ext=mp4]/best[ext=mp4]',
-        # Alternatively, a simpler format for video only (without audio):
-        # 'format': 'bestvideo[height>=720][ext=mp4]/best[ext=mp4]',
-        # Or you can target 1080p (larger files, longer download):
-        # 'format': 'bestvideo[height>=1080][ext=mp4]+bestaudio[ext=m4a]/best[height>=1080][ext=mp4]/best[ext=mp4]',
+        # FORMAT OPTION:
+        # Selects the best video-only MP4 stream up to 480p height, falling back to a combined
+        # MP4 up to 480p and then to any MP4. The audio track is never needed and 480p is enough
+        # for FLAG_ overlay text, so less data is streamed, decoded and OCR'd.
+        'format': 'bestvideo[height<=480][ext=mp4]/best[height<=480][ext=mp4]/best[ext=mp4]',
+        # If small text is not recognized, a higher resolution can be targeted (larger streams):
+        # 'format': 'bestvideo[height<=720][ext=mp4]/best[height<=720][ext=mp4]/best[ext=mp4]',
+        'skip_download': True, # Subtitles are still written, the video is streamed instead
         'writesubtitles': True,
         'writeautomaticsub': True,
         'subtitleslangs': ['en'],
-        'outtmpl': f"{video['id']}.%(ext)s", # Ensures the downloaded file name starts with the video ID
-        'postprocessors': [{ # To merge if video and audio are downloaded separately
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4', # Ensures the final output is mp4
-        }],
+        'outtmpl': f"{video['id']}.%(ext)s", # Ensures the subtitle file name starts with the video ID
     }
 
-    downloaded_video_path = None
-    info_dict = None
-
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # download=True is needed for the subtitles; 'skip_download' keeps the video off the disk
             info_dict = ydl.extract_info(video["url"], download=True)
-            # It might be more reliable to get the downloaded file name from info_dict
-            # yt-dlp can sometimes use different file names than specified in 'outtmpl' (e.g., _video_id)
-            # However, 'outtmpl' should generally match video['id'].
-            downloaded_video_path = f"{video['id']}.mp4" # or info_dict.get('requested_downloads')[0]['filepath']
-
-            # If there's a '_filename' or 'filepath' key in info_dict, it's more accurate to use that
-            # For example: downloaded_video_path = info_dict.get('_filename') or info_dict.get('filepath')
-            # But in its simplest form, we rely on the outtmpl template:
-            if not os.path.exists(downloaded_video_path) and info_dict:
-                 # If the initial guess fails, try to find the file path from info_dict
-                if 'requested_downloads' in info_dict and len(info_dict['requested_downloads']) > 0:
-                    downloaded_video_path = info_dict['requested_downloads'][0]['filepath']
-                elif '_filename' in info_dict: # Sometimes this key provides the full path
-                    downloaded_video_path = info_dict['_filename']
-                elif 'filepath' in info_dict: # Alternative
-                     downloaded_video_path = info_dict['filepath']
-                # If still not found and not video['id'] + ".mp4", there's an issue.
-
-        if not info_dict:
-            print(f"❌ Video information could not be retrieved: {video['url']}")
-            return None, None
+        return info_dict, get_stream_source(info_dict)
+    except yt_dlp.utils.DownloadError as de:
+        print(f"❌ Video info error (yt-dlp): {de}")
+    except Exception as e:
+        print(f"❌ General error while resolving the video: {e}")
+    return None, None
+
+def fetch_video(video):
+    """
+    Resolves a video (see fetch_video_info) and decodes its sampled frames from the stream.
+    Frames are only decoded if the description and subtitles hold no flag, since scan_video checks those first.
+    Returns a tuple of (info_dict, frames); info_dict is None if the video could not be resolved.
+    """
+    info_dict, stream_source = fetch_video_info(video)
+    if not info_dict:
+        return None, []
+    try:
+        if scan_description_and_subs(info_dict, video["id"])[0]:
+            return info_dict, []
+        if not stream_source:
+            print(f"❌ No video stream URL found: {video['url']}")
+            return info_dict, []
+        stream_url, options = stream_source
+        print(f"🎞️ Extracting frames from stream: {video['url']}")
+        return info_dict, extract_frames_every_n_seconds(stream_url, interval=1, options=options)
+    except Exception as e:
+        print(f"❌ General error while extracting frames: {e}")
+    return info_dict, []
+
+_VIDEOS_DONE = object()
+
+def fetch_in_background(videos, maxsize=1):
+    """
+    Fetches video info, subtitles and sampled frames (see fetch_video) in a background thread so that
+    the next video is downloaded and decoded while the caller OCRs the current one (network and OCR work overlap).
+    At most 'maxsize' fetched videos wait in the queue, which bounds the memory used by their frames.
+    Yields (video, info_dict, frames) tuples in the given order.
+    """
+    ready = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
 
+    def producer():
+        try:
+            for video in videos:
+                if stop.is_set():
+                    break
+                ready.put((video, *fetch_video(video)))
+        finally:
+            ready.put(_VIDEOS_DONE)
+
+    threading.Thread(target=producer, daemon=True).start()
+    finished = False
+    try:
+        while True:
+            item = ready.get()
+            if item is _VIDEOS_DONE:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished:
+            # The caller stopped early: let the producer exit
+            stop.set()
+            while ready.get() is not _VIDEOS_DONE:
+                pass
+
+def scan_video(video, info_dict, frames, ocr_pool):
+    """
+    Scans a video's description, subtitles, and frames for a 'FLAG_' pattern.
+    Prioritizes description/subtitles scan before the frames, which fetch_video has already decoded
+    directly from the stream URL, so no video file is written or deleted.
+    """
+    if not info_dict:
+        print(f"❌ Video information could not be retrieved: {video['url']}")
+        return None, None
+
+    try:
         # 1. Check description/subtitles
         # We pass info_dict to the scan_description_and_subs function
         flag, source = scan_description_and_subs(info_dict, video["id"])
         if flag:
-            # Delete the video file (even if found only from description/subtitles)
-            if downloaded_video_path and os.path.exists(downloaded_video_path):
-                try:
-                    os.remove(downloaded_video_path)
-                except OSError as e:
-                    print(f"⚠️ Video file could not be deleted: {e}")
             return flag, source
 
         # 2. Scan video frames
-        if downloaded_video_path and os.path.exists(downloaded_video_path):
-            print(f"🎞️ Extracting frames: {downloaded_video_path}")
-            frames = extract_frames_every_n_seconds(downloaded_video_path, interval=1)
-            if frames:
-                flag, source = detect_flag_with_tesseract(frames, video["id"])
-            # Delete the downloaded video file after processing
-            try:
-                os.remove(downloaded_video_path)
-                print(f"🗑️ Video deleted: {downloaded_video_path}")
-            except OSError as e:
-                print(f"⚠️ Video file could not be deleted: {e}")
-
-            # If flag was found in frames, return it
-            if flag:
-                return flag, source
-        else:
-            print(f"❌ Downloaded video file not found: {downloaded_video_path if downloaded_video_path else video['id']+'.mp4'}")
+        if frames:
+            return detect_flag_with_tesseract(frames, video["id"], ocr_pool)
 
-    except yt_dlp.utils.DownloadError as de:
-        print(f"❌ Video download error (yt-dlp): {de}")
     except Exception as e:
         print(f"❌ General error during video scan: {e}")
-        # Even in case of error, we can try to delete the downloaded file
-        if downloaded_video_path and os.path.exists(downloaded_video_path):
-            try:
-                os.remove(downloaded_video_path)
-            except OSError as err_remove:
-                print(f"⚠️ Video file could not be deleted after error: {err_remove}")
     return None, None
 
 def main():
     """
     Main function to orchestrate the video scanning process.
-    Reads URLs from 'deneme.txt', retrieves metadata, sorts videos by upload date (newest first),
-    and then scans each video for a flag.
+    Reads URLs from 'video_urls.txt', retrieves metadata concurrently, scans videos by upload date (newest first)
+    as soon as their metadata is known, and downloads the next video's frames in the background while scanning.
     """
     urls = read_video_urls("video_urls.txt")
     print(f"📄 Number of video URLs loaded: {len(urls)}.")
 
-    videos = []
-    for idx, url in enumerate(urls, 1):
-        print(f"[{idx}/{len(urls)}] Getting metadata...")
-        meta = get_video_metadata(url)
-        if meta:
-            videos.append(meta)
+    # The OCR workers are forked once, before any metadata or stream thread exists
+    ocr_pool = create_ocr_pool()
 
-    # Sort videos from newest to oldest
-    videos.sort(key=lambda x: x["upload_date"], reverse=True)
+    # Metadata is fetched concurrently and videos are handed over newest first as soon as
+    # enough metadata has arrived. The next video's frames are downloaded in the background while
+    # the current one is scanned.
+    print(f"🌐 Getting metadata for {len(urls)} videos...")
+    videos = videos_newest_first(urls)
+    sources = fetch_in_background(videos)
 
     found_any_flag = False
-    for i, video in enumerate(videos, 1):
-        print(f"\n[{i}/{len(videos)}] Scanning: {video['title']} ({video['upload_date'].strftime('%Y-%m-%d')})")
-        flag, source = scan_video(video)
-        if flag:
-            print(f"\n✅ FLAG FOUND: {flag} (source: {source})")
-            print(f"🔗 Video URL: {video['url']}")
-            found_any_flag = True
-            # Optional: Uncomment 'break' to stop after the first flag is found,
-            # otherwise all videos will be scanned.
-            # break
+    try:
+        for i, (video, info_dict, frames) in enumerate(sources, 1):
+            print(f"\n[{i}/{len(urls)}] Scanning: {video['title']} ({video['upload_date'].strftime('%Y-%m-%d')})")
+            flag, source = scan_video(video, info_dict, frames, ocr_pool)
+            if flag:
+                print(f"\n✅ FLAG FOUND: {flag} (source: {source})")
+                print(f"🔗 Video URL: {video['url']}")
+                found_any_flag = True
+                # Optional: Uncomment 'break' to stop after the first flag is found,
+                # otherwise all videos will be scanned.
+                # break
+    finally:
+        # Stops the background downloads and the metadata requests if the loop ended early
+        sources.close()
+        videos.close()
+        ocr_pool[0].terminate()
 
     if not found_any_flag:
         print("\n🚫 No FLAG_ found in any video.")
 
 if __name__ == "__main__":
-    # You might need to specify the path where Pytesseract is installed, especially on Windows:
+    # You might need to specify where the Tesseract language data is installed, especially on Windows:
     # Example:
     # if os.name == 'nt': # For Windows
-    #     pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    #     os.environ['TESSDATA_PREFIX'] = r'C:\Program Files\Tesseract-OCR\tessdata'
     main()
@@ -7,17 +7,117 @@ import time
 from datetime import datetime
 import csv
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Each worker thread keeps one YoutubeDL instance and reuses it for all links it fetches
+_thread_local = threading.local()
+
+def get_thread_ydl(ydl_opts: dict):
+    """
+    Returns the yt_dlp.YoutubeDL instance of the current thread, creating it on first use.
+    yt-dlp instances must not be shared between threads, but can be reused by one thread.
+    """
+    ydl = getattr(_thread_local, "ydl", None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(ydl_opts)
+        _thread_local.ydl = ydl
+    return ydl
+
+# Rate-limit responses seen by all workers; drives the exponential backoff of the worker that hits one
+_rate_limit_lock = threading.Lock()
+_rate_limit_hits = 0
+
+def is_rate_limited(error: Exception) -> bool:
+    """
+    Returns True if a yt-dlp error means YouTube is throttling us (HTTP 429 / rate-limited response).
+    Deleted or private videos are also reported as "unavailable", so that message only counts
+    when YouTube adds "try again later", which it does when throttling.
+    """
+    message = str(error).lower()
+    return (
+        "http error 429" in message
+        or "rate-limited" in message
+        or ("unavailable" in message and "try again later" in message)
+    )
+
+def rate_limit_backoff(initial_delay: int) -> int:
+    """
+    Records a rate-limit response and returns how many seconds the calling worker should wait.
+    The delay doubles with every recent rate-limit response (capped at 32x 'initial_delay').
+    """
+    global _rate_limit_hits
+    with _rate_limit_lock:
+        _rate_limit_hits += 1
+        return initial_delay * 2 ** min(_rate_limit_hits - 1, 5)
+
+def rate_limit_recovered():
+    """
+    Lowers the backoff after a successful request, so delays shrink again once throttling stops.
+    """
+    global _rate_limit_hits
+    with _rate_limit_lock:
+        _rate_limit_hits = max(_rate_limit_hits - 1, 0)
+
+def fetch_video_metadata(
+    link: str,
+    position: str,
+    ydl_opts: dict,
+    initial_delay: int,
+    max_retries: int
+):
+    """
+    Retrieves the title and publish date of a single YouTube video using yt-dlp.
+    Runs as one task of the thread pool and uses the worker thread's own yt_dlp.YoutubeDL instance.
+    Requests are sent without any delay; only when YouTube rate-limits this request does the worker
+    sleep (exponential backoff starting at 'initial_delay') before retrying, while other workers continue.
+    Returns a dictionary with 'link', 'title' and 'date', or None if it could not be fetched.
+    """
+    ydl = get_thread_ydl(ydl_opts)
+    attempt = 0
+    while attempt < max_retries:
+        print(f"  {position}: Fetching metadata for '{link}' (Attempt {attempt + 1}/{max_retries})...")
+        try:
+            info = ydl.extract_info(link, download=False)
+            rate_limit_recovered()
+            upload_date_str = info.get('upload_date')
+            video_title = info.get('title', 'Title Not Found')
+
+            if upload_date_str:
+                upload_date = datetime.strptime(upload_date_str, '%Y%m%d')
+                return {'link': link, 'title': video_title, 'date': upload_date}
+            print(f"    Warning: No publish date found for '{link}'. Skipping.")
+            return None # No date, no need to retry
+        except yt_dlp.utils.DownloadError as e:
+            print(f"    Error fetching metadata for '{link}': {e}")
+            if is_rate_limited(e):
+                attempt += 1
+                delay = rate_limit_backoff(initial_delay)
+                if attempt < max_retries:
+                    print(f"    WARNING: Rate-limited. Retrying in {delay}s.")
+                    time.sleep(delay) # Only this worker waits, the others keep going
+            else:
+                print(f"    Error not resolvable by retry. Skipping.")
+                return None # Other errors, don't retry
+        except Exception as e:
+            print(f"    An unexpected error occurred for '{link}': {e}. Skipping.")
+            return None # Other errors, don't retry
+
+    print(f"    WARNING: Failed to fetch metadata for '{link}' after {max_retries} attempts. Skipping.")
+    return None
 
 def get_and_sort_youtube_videos(
     url: str,
     output_csv_filename: str = "youtube_videos_sorted_by_date.csv",
-    initial_delay: int = 30, # Initial delay between requests in seconds
-    max_retries: int = 3     # Max attempts for fetching video metadata
+    initial_delay: int = 30, # Base backoff delay in seconds after a rate-limit response
+    max_retries: int = 3,    # Max attempts for fetching video metadata
+    max_workers: int = 8     # Number of videos whose metadata is fetched concurrently
 ):
     """
     Fetches YouTube video links from a given URL, retrieves video title and publish date
     using yt-dlp, sorts them from newest to oldest, and saves to a CSV file.
-    Includes a retry mechanism with increasing delays to handle YouTube's rate limiting.
+    Metadata is fetched concurrently by a thread pool of 'max_workers' threads.
+    Requests are not delayed; a worker only backs off (exponentially) when YouTube rate-limits it.
     """
     print(f"Fetching content from URL: {url}")
 
@@ -40,9 +140,8 @@ def get_and_sort_youtube_videos(
             print("No YouTube video links found on the page matching the specified patterns.")
             return
 
-        print(f"Found {len(youtube_links)} YouTube video links. Fetching metadata (initial delay: {initial_delay}s)...")
+        print(f"Found {len(youtube_links)} YouTube video links. Fetching metadata (rate-limit backoff: {initial_delay}s)...")
 
-        video_data = []
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
@@ -50,37 +149,20 @@ def get_and_sort_youtube_videos(
             'force_generic_extractor': True,
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            for i, link in enumerate(youtube_links):
-                attempt = 0
-                while attempt < max_retries:
-                    print(f"  {i+1}/{len(youtube_links)}: Fetching metadata for '{link}' (Attempt {attempt + 1}/{max_retries})...")
-                    try:
-                        info = ydl.extract_info(link, download=False)
-                        upload_date_str = info.get('upload_date')
-                        video_title = info.get('title', 'Title Not Found')
-
-                        if upload_date_str:
-                            upload_date = datetime.strptime(upload_date_str, '%Y%m%d')
-                            video_data.append({'link': link, 'title': video_title, 'date': upload_date})
-                            break # Success, move to next video
-                        else:
-                            print(f"    Warning: No publish date found for '{link}'. Skipping.")
-                            break # No date, no need to retry
-                    except yt_dlp.utils.DownloadError as e:
-                        print(f"    Error fetching metadata for '{link}': {e}")
-                        if "rate-limited" in str(e).lower() or "video unavailable" in str(e).lower():
-                            print(f"    WARNING: Rate-limited or video unavailable. Retrying with increased delay.")
-                            attempt += 1
-                            time.sleep(initial_delay * (attempt + 1)) # Increase delay for subsequent retries
-                        else:
-                            print(f"    Error not resolvable by retry. Skipping.")
-                            break # Other errors, don't retry
-                    except Exception as e:
-                        print(f"    An unexpected error occurred for '{link}': {e}. Skipping.")
-                        break # Other errors, don't retry
-                else:
-                    print(f"    WARNING: Failed to fetch metadata for '{link}' after {max_retries} attempts. Skipping.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    fetch_video_metadata,
+                    link,
+                    f"{i+1}/{len(youtube_links)}",
+                    ydl_opts,
+                    initial_delay,
+                    max_retries
+                )
+                for i, link in enumerate(youtube_links)
+            ]
+            video_data = [future.result() for future in futures]
+        video_data = [item for item in video_data if item]
 
         if not video_data:
             print("No YouTube videos with obtainable publish dates were found.")
@@ -115,8 +197,9 @@ if __name__ == "__main__":
     output_csv_file = "youtube_videos_sorted_by_date.csv"
 
     # Configure delay and retries here:
-    custom_initial_delay_seconds = 30 # Initial delay for each video request
+    custom_initial_delay_seconds = 30 # Base backoff delay after a rate-limit response
     custom_max_retries = 3           # Max attempts for each video
+    custom_max_workers = 8           # Concurrent metadata requests
 
-    print(f"Script starting with initial delay: {custom_initial_delay_seconds}s and max retries: {custom_max_retries}.")
-    get_and_sort_youtube_videos(target_url, output_csv_file, custom_initial_delay_seconds, custom_max_retries)
+    print(f"Script starting with rate-limit backoff: {custom_initial_delay_seconds}s, max retries: {custom_max_retries} and {custom_max_workers} workers.")
+    get_and_sort_youtube_videos(target_url, output_csv_file, custom_initial_delay_seconds, custom_max_retries, custom_max_workers)